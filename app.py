@@ -1,9 +1,16 @@
 import base64
+import functools
+import sys
+import cachetools
 import viktor as vkt
-from typing import Any
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, NamedTuple
 from aps_viewer_sdk import APSViewer
 from aps_viewer_sdk.helper import get_all_model_properties, get_metadata_viewables
 from aps_viewer_sdk.client import ElementsInScene
+import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
@@ -26,7 +33,146 @@ PROPERTY_OPTIONS = [
     "Manufacturer",
 ]
 
+# Property keys that may carry the P&ID id, in lookup order
+PID_KEYS = ("PnPID", "PId", "PID", "P&ID")
 
+
+def _empty_takeoff_figure(text: str) -> go.Figure:
+    """Annotation-only figure for the quantity takeoff empty states."""
+    fig = go.Figure()
+    fig.add_annotation(
+        text=text,
+        xref="paper", yref="paper",
+        x=0.5, y=0.5, showarrow=False,
+        font=dict(size=16)
+    )
+    fig.update_layout(
+        title="Quantity Takeoff - PID Elements by Class Name",
+        showlegend=False
+    )
+    return fig
+
+
+# Built once at import time; reused (never mutated) across renders so the
+# cold-selection path skips Plotly's per-figure validation overhead
+_EMPTY_FIG_NO_SELECTION = _empty_takeoff_figure("Please select a Plant 3D file and viewable")
+_EMPTY_FIG_NO_PID = _empty_takeoff_figure("No PID elements found in the selected view")
+
+
+@cachetools.cached(cachetools.LRUCache(maxsize=8))
+def _build_takeoff_figure_dict(sorted_items: tuple[tuple[str, int], ...]) -> dict[str, Any]:
+    """
+    Build the quantity takeoff figure for the given (class, count) pairs and
+    return it as a plain dict. Cached on the counts themselves, so re-renders
+    with an unchanged model skip the subplot/trace/layout assembly and only
+    pay a cheap go.Figure(dict) reconstruction.
+    """
+    # Unpack once; format labels with underscores replaced for readability
+    class_names, values = zip(*sorted_items)
+    labels = [class_name.replace('_', ' ') for class_name in class_names]
+    total_count = sum(values)
+
+    # Create subplots: pie chart on left, horizontal bar chart on right
+    fig = make_subplots(
+        rows=1, cols=2,
+        specs=[[{"type": "pie"}, {"type": "bar"}]],
+        column_widths=[0.35, 0.65],
+        horizontal_spacing=0.35,
+        subplot_titles=("Distribution Overview", "Count by Class Name")
+    )
+
+    # Pie chart - show top 8 categories, group rest as "Other"
+    top_n = 8
+    if len(labels) > top_n:
+        pie_labels = labels[:top_n] + ["Other"]
+        pie_values = values[:top_n] + (sum(values[top_n:]),)
+    else:
+        pie_labels = labels
+        pie_values = values
+
+    # Color palette for consistency
+    colors = [
+        '#636EFA', '#EF553B', '#00CC96', '#AB63FA', '#FFA15A',
+        '#19D3F3', '#FF6692', '#B6E880', '#FF97FF', '#FECB52'
+    ]
+
+    fig.add_trace(
+        go.Pie(
+            labels=pie_labels,
+            values=pie_values,
+            hole=0.4,
+            textinfo='percent',
+            textposition='outside',
+            marker=dict(colors=colors[:len(pie_labels)]),
+            hovertemplate="<b>%{label}</b><br>Count: %{value}<br>Percentage: %{percent}<extra></extra>",
+            showlegend=False
+        ),
+        row=1, col=1
+    )
+
+    # Horizontal bar chart - all categories, sorted ascending for bottom-to-top reading
+    bar_labels = labels[::-1]  # Reverse so highest is at top
+    bar_values = values[::-1]
+
+    # Assign colors based on value (gradient effect); arithmetic is
+    # vectorized, only the string formatting stays in Python
+    vals = np.asarray(bar_values, dtype=np.float64)
+    max_val = float(values[0])  # counts are sorted descending
+    alphas = 0.4 + 0.6 * (vals / max_val)
+    bar_colors = [f'rgba(99, 110, 250, {alpha})' for alpha in alphas.tolist()]
+
+    fig.add_trace(
+        go.Bar(
+            x=bar_values,
+            y=bar_labels,
+            orientation='h',
+            marker=dict(
+                color=bar_colors,
+                line=dict(color='rgba(99, 110, 250, 1)', width=1)
+            ),
+            text=bar_values,
+            textposition='outside',
+            hovertemplate="<b>%{y}</b><br>Count: %{x}<br>Percentage: %{customdata:.1f}%<extra></extra>",
+            customdata=(vals * (100.0 / total_count)).tolist(),
+            showlegend=False
+        ),
+        row=1, col=2
+    )
+
+    # Calculate dynamic height based on number of categories
+    chart_height = max(500, len(labels) * 25 + 150)
+
+    fig.update_layout(
+        title=dict(
+            text=f"<b>Quantity Takeoff - PID Elements by Class Name</b><br><sup>Total: {total_count} elements | {len(labels)} unique classes</sup>",
+            x=0.5,
+            xanchor='center',
+            font=dict(size=18)
+        ),
+        height=chart_height,
+        margin=dict(t=100, b=50, l=200, r=80),
+        showlegend=False
+    )
+
+    # Update bar chart x-axis
+    fig.update_xaxes(
+        title_text="Count",
+        row=1, col=2,
+        gridcolor='lightgray',
+        range=[0, values[0] * 1.15]  # Add space for labels; sorted descending
+    )
+
+    # Update bar chart y-axis
+    fig.update_yaxes(
+        title_text="",
+        row=1, col=2,
+        tickfont=dict(size=10)
+    )
+
+    return fig.to_dict()
+
+
+@functools.lru_cache(maxsize=256)
 def to_md_urn(value: str) -> str:
     """Convert URN to base64 encoded format for Model Derivative API calls."""
     if value.startswith("urn:"):
@@ -40,6 +186,9 @@ def find_prop_any_group(obj_props: dict[str, Any], key: str) -> Any | None:
     Properties come as:
       obj["properties"] = { "Group A": {"Prop1": ...}, "Group B": {"Tag": ...}, ... }
     This searches every group for the given key.
+
+    Fallback for one-off lookups on malformed payloads; the hot paths flatten
+    the groups once via _flatten_props and use O(1) dict gets instead.
     """
     if not isinstance(obj_props, dict):
         return None
@@ -50,82 +199,192 @@ def find_prop_any_group(obj_props: dict[str, Any], key: str) -> Any | None:
     return None
 
 
-def build_tag_index(
+def _flatten_props(obj_props: dict[str, Any]) -> dict[str, Any]:
+    """
+    Merge all property groups of an object into a single dict, so lookups
+    like "Tag" or "Class Name" are one hash probe instead of a scan over
+    every group.
+
+    Keys are interned on the way in: JSON-decoded keys are fresh string
+    objects, while the lookup literals ("Tag", "PnPID", ...) are interned by
+    CPython, so interning lets the dict probes compare by identity instead
+    of hashing and comparing cache-cold key bytes every time.
+    """
+    flat_props: dict[str, Any] = {}
+    _intern = sys.intern
+    for group_props in obj_props.values():
+        if isinstance(group_props, dict):
+            for key, value in group_props.items():
+                flat_props[_intern(key)] = value
+    return flat_props
+
+
+def _iter_flat_records(collection: list[Any]):
+    """
+    Yield (obj, flat_props) for every well-formed object in the collection.
+
+    Objects in real APS payloads are always dicts with a "properties" key,
+    so rather than paying two isinstance checks per object the happy path
+    just indexes; the near-zero malformed case raises and is skipped.
+    """
+    for obj in collection:
+        try:
+            flat_props = _flatten_props(obj["properties"])
+        except (TypeError, KeyError, AttributeError):
+            continue
+
+        yield obj, flat_props
+
+
+class TagRecord(NamedTuple):
+    """
+    Per-tag record in the tag index. A NamedTuple instead of a 4-key dict:
+    several times smaller per entry on large models and cheaper to pickle
+    for the caches, with attribute access for consumers.
+    """
+    objectid: int | None
+    name: str | None
+    pid: Any
+    properties: dict[str, Any]
+
+
+class ModelIndices(NamedTuple):
+    """All structures derived from one pass over the properties payload."""
+    tag_index: dict[str, TagRecord]
+    class_counts: Counter[str]
+    by_class_name: dict[str, list[dict[str, Any]]]
+    sorted_tags: tuple[str, ...]
+    sorted_class_counts: tuple[tuple[str, int], ...]
+
+
+def build_all_indices(
     properties_payload: dict[str, Any],
     *,
-    pid_keys: tuple[str, ...] = ("PnPID", "PId", "PID", "P&ID"),
+    pid_keys: tuple[str, ...] = PID_KEYS,
     tag_key: str = "Tag",
-) -> dict[str, dict[str, Any]]:
+) -> ModelIndices:
     """
-    Returns:
-      {
-        "AV-309": {
-           "objectid": 123,
-           "name": "ACPPASSET [4612B]",
-           "pid": 714,
-           "properties": {... original grouped properties ...}
-        },
-        ...
-      }
-
-    If Tag repeats, it keeps the first and appends a suffix for the rest:
-      "AV-309#123", "AV-309#456", ...
+    Build every derived structure in a single pass over the collection:
+
+      tag_index:     Tag -> TagRecord(objectid, name, pid, properties)
+                     (duplicate tags get a "#<objectid>" suffix)
+      class_counts:  Class Name -> number of PID elements
+      by_class_name: Class Name -> [{"externalId", "flat_props"}, ...]
+                     (all objects, used by the QA/QC view)
+
+    plus the pre-sorted tag list and count-descending class counts that the
+    option providers serve on every UI refresh. Walking the payload once and
+    flattening each object's property groups once is much cheaper than the
+    separate scans and per-render sorts it replaces.
     """
     data = properties_payload.get("data", {})
     collection = data.get("collection", [])
     if not isinstance(collection, list):
-        return {}
+        return ModelIndices({}, Counter(), {}, (), ())
 
-    out: dict[str, dict[str, Any]] = {}
+    tag_index: dict[str, TagRecord] = {}
+    class_counts: Counter[str] = Counter()
+    by_class_name: dict[str, list[dict[str, Any]]] = {}
 
-    for obj in collection:
-        if not isinstance(obj, dict):
-            continue
+    # Pre-bind the methods resolved on every iteration of the hot loop
+    by_class_setdefault = by_class_name.setdefault
+    tag_setdefault = tag_index.setdefault
+
+    for obj, flat_props in _iter_flat_records(collection):
+        class_name = flat_props.get("Class Name")
+
+        # Group every classed object for the QA/QC view (PID or not).
+        # Highlighting needs an externalId, so objects without one are
+        # dropped here instead of being re-checked on every render.
+        if class_name is not None:
+            external_id = obj.get("externalId")
+            if external_id:
+                by_class_setdefault(class_name, []).append({
+                    "externalId": external_id,
+                    "flat_props": flat_props,
+                })
 
-        obj_props = obj.get("properties")
-        if not isinstance(obj_props, dict):
+        # Only the P&ID elements feed the counts and the tag index
+        pid = next((flat_props[k] for k in pid_keys if k in flat_props), None)
+        if pid is None:
             continue
 
-        tag_val = find_prop_any_group(obj_props, tag_key)
+        # Class Name / Tag are almost always str already; skip the str() call
+        # for that common case to cut per-object overhead in this hot loop
+        if class_name is None:
+            count_key = "Unknown"
+        else:
+            if type(class_name) is not str:
+                class_name = str(class_name)
+            count_key = class_name.strip() or "Unknown"
+        class_counts[count_key] += 1
+
+        tag_val = flat_props.get(tag_key)
         if tag_val is None:
             continue
 
-        tag = str(tag_val).strip()
+        tag = tag_val.strip() if type(tag_val) is str else str(tag_val).strip()
         if not tag:
             continue
 
-        pid = None
-        for k in pid_keys:
-            pid = find_prop_any_group(obj_props, k)
-            if pid is not None:
-                break
-        if pid is None:
-            continue  # only keep items that have a P&ID id
-
         objectid = obj.get("objectid")
         name = obj.get("name")
 
-        record = {
-            "objectid": objectid,
-            "name": name,
-            "pid": pid,
-            "properties": obj_props,
-        }
+        record = TagRecord(
+            objectid=objectid,
+            name=name,
+            pid=pid,
+            properties=obj.get("properties"),
+        )
 
-        # Handle duplicate tags safely
-        if tag not in out:
-            out[tag] = record
-        else:
+        # Handle duplicate tags safely; setdefault keeps the common
+        # non-duplicate case down to a single hash probe
+        existing = tag_setdefault(tag, record)
+        if existing is not record:
             suffix = f"#{objectid}" if objectid is not None else "#dup"
-            out[f"{tag}{suffix}"] = record
+            tag_index[f"{tag}{suffix}"] = record
+
+    # Rebuild the tag index in sorted key order (one sort, at build time)
+    # so iterating it is already sorted and the tag tuple comes for free
+    tag_index = dict(sorted(tag_index.items()))
+
+    return ModelIndices(
+        tag_index=tag_index,
+        class_counts=class_counts,
+        by_class_name=by_class_name,
+        sorted_tags=tuple(tag_index),
+        sorted_class_counts=tuple(class_counts.most_common()),
+    )
+
+
+def build_tag_index(
+    properties_payload: dict[str, Any],
+    *,
+    pid_keys: tuple[str, ...] = PID_KEYS,
+    tag_key: str = "Tag",
+) -> dict[str, TagRecord]:
+    """
+    Returns:
+      {
+        "AV-309": TagRecord(
+           objectid=123,
+           name="ACPPASSET [4612B]",
+           pid=714,
+           properties={... original grouped properties ...}
+        ),
+        ...
+      }
 
-    return out
+    If Tag repeats, it keeps the first and appends a suffix for the rest:
+      "AV-309#123", "AV-309#456", ...
+    """
+    return build_all_indices(properties_payload, pid_keys=pid_keys, tag_key=tag_key).tag_index
 
 
 def build_class_name_counts(properties_payload: dict[str, Any]) -> dict[str, int]:
     """
     Count PID elements grouped by Class Name.
-    
+
     Returns:
       {
         "Double_Seat_4_Port": 5,
@@ -133,64 +392,47 @@ def build_class_name_counts(properties_payload: dict[str, Any]) -> dict[str, int
         ...
       }
     """
-    data = properties_payload.get("data", {})
-    collection = data.get("collection", [])
-    if not isinstance(collection, list):
-        return {}
+    return build_all_indices(properties_payload).class_counts
 
-    counts: dict[str, int] = {}
 
-    for obj in collection:
-        if not isinstance(obj, dict):
-            continue
+# Bounded in-process caches for the large properties payload and the indices
+# derived from it. Keyed by (urn_bs64, model_guid) only: the payload does not
+# depend on the token, so token rotation must not duplicate cache entries.
+_PAYLOAD_CACHE: cachetools.LRUCache = cachetools.LRUCache(maxsize=16)
+_INDICES_CACHE: cachetools.LRUCache = cachetools.LRUCache(maxsize=16)
 
-        obj_props = obj.get("properties")
-        if not isinstance(obj_props, dict):
-            continue
-
-        # Only count elements that have a PID (are part of the P&ID)
-        pid = None
-        for k in ("PnPID", "PId", "PID", "P&ID"):
-            pid = find_prop_any_group(obj_props, k)
-            if pid is not None:
-                break
-        if pid is None:
-            continue
 
-        # Get Class Name
-        class_name = find_prop_any_group(obj_props, "Class Name")
-        if class_name is None:
-            class_name = "Unknown"
-        else:
-            class_name = str(class_name).strip()
-            if not class_name:
-                class_name = "Unknown"
-
-        counts[class_name] = counts.get(class_name, 0) + 1
+@cachetools.cached(_INDICES_CACHE, key=lambda *, token, urn_bs64, model_guid: (urn_bs64, model_guid))
+def get_all_indices_cached(*, token: str, urn_bs64: str, model_guid: str) -> ModelIndices:
+    """
+    Cached function to build every derived index (tag index, class name
+    counts, objects grouped by class name) in one pass over the shared
+    cached payload, so the payload is fetched and walked once per model.
+    """
+    properties_payload = get_properties_payload_cached(
+        token=token,
+        urn_bs64=urn_bs64,
+        model_guid=model_guid
+    )
 
-    return counts
+    return build_all_indices(properties_payload)
 
 
-@vkt.memoize
 def get_class_name_counts_cached(*, token: str, urn_bs64: str, model_guid: str) -> dict[str, int]:
-    """
-    Cached function to get all model properties and build Class Name counts.
-    This is memoized to avoid repeated API calls for the same model.
-    """
-    properties_payload = get_all_model_properties(
+    """Get the Class Name counts from the shared cached indices."""
+    return get_all_indices_cached(
         token=token,
         urn_bs64=urn_bs64,
         model_guid=model_guid
-    )
-    
-    return build_class_name_counts(properties_payload)
+    ).class_counts
 
 
-@vkt.memoize
+@cachetools.cached(_PAYLOAD_CACHE, key=lambda *, token, urn_bs64, model_guid: (urn_bs64, model_guid))
 def get_properties_payload_cached(*, token: str, urn_bs64: str, model_guid: str) -> dict[str, Any]:
     """
-    Cached function to get all model properties payload.
-    This is memoized to avoid repeated API calls for the same model.
+    Single source of truth for the large properties payload. The bounded LRU
+    cache avoids both repeated API calls and duplicate deserialization of the
+    same model across the derived-index helpers.
     """
     return get_all_model_properties(
         token=token,
@@ -209,20 +451,147 @@ def get_metadata_views_cached(*, token: str, urn_bs64: str) -> list[dict[str, An
     return metadata_views if metadata_views else []
 
 
-@vkt.memoize
-def get_tag_index_cached(*, token: str, urn_bs64: str, model_guid: str) -> dict[str, dict[str, Any]]:
+def get_tag_index_cached(*, token: str, urn_bs64: str, model_guid: str) -> dict[str, TagRecord]:
+    """Get the Tag index from the shared cached indices."""
+    return get_all_indices_cached(
+        token=token,
+        urn_bs64=urn_bs64,
+        model_guid=model_guid
+    ).tag_index
+
+
+def _get_access_token() -> str:
+    """
+    Access token for the APS integration, resolved fresh per call.
+
+    Deliberately NOT cached at module level: get_access_token returns the
+    token of the user behind the current job, and a worker process may serve
+    jobs for different users, so a process-wide cache could hand user B a
+    token belonging to user A. Each view/option provider resolves the token
+    once per evaluation and passes it down, so the per-evaluation cost is a
+    single OAuth round-trip, same as before.
+    """
+    integration = vkt.external.OAuth2Integration("aps-integration-viktor")
+    return integration.get_access_token()
+
+
+@cachetools.cached(
+    cachetools.TTLCache(maxsize=64, ttl=300),
+    key=lambda autodesk_file, token: (getattr(autodesk_file, "id", id(autodesk_file)), hash(token)),
+)
+def _latest_version_urn(autodesk_file, token: str) -> tuple[str, str]:
+    """
+    Resolve (version_urn, urn_bs64) for a file. get_latest_version is a
+    network RPC that every view and option provider needs, so cache it for a
+    short TTL instead of paying one round-trip per invocation.
     """
-    Cached function to get all model properties and build Tag index.
-    This is memoized to avoid repeated API calls for the same model.
+    version = autodesk_file.get_latest_version(token)
+    version_urn = version.urn
+    return version_urn, to_md_urn(version_urn)
+
+
+@dataclass
+class ModelContext:
+    """Everything the views need from APS for the selected file/viewable."""
+    token: str
+    version_urn: str
+    urn_bs64: str
+    metadata_views: list[dict[str, Any]]
+    indices: ModelIndices | None = None
+
+
+def _fetch_context(
+    autodesk_file, model_guid: str | None = None, *, include_views: bool = True
+) -> ModelContext:
     """
-    properties_payload = get_all_model_properties(
+    Resolve the token/URN once and fetch only what the caller asks for:
+    metadata viewables (include_views), derived property indices
+    (model_guid), or both. When both are needed they are fanned out on a
+    thread pool, so wall time is the slowest call instead of their sum.
+    """
+    token = _get_access_token()
+    version_urn, urn_bs64 = _latest_version_urn(autodesk_file, token)
+
+    metadata_views: list[dict[str, Any]] = []
+    indices = None
+
+    if include_views and model_guid:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            views_future = pool.submit(
+                get_metadata_views_cached, token=token, urn_bs64=urn_bs64
+            )
+            indices_future = pool.submit(
+                get_all_indices_cached,
+                token=token, urn_bs64=urn_bs64, model_guid=model_guid
+            )
+            metadata_views = views_future.result()
+            indices = indices_future.result()
+    elif include_views:
+        metadata_views = get_metadata_views_cached(token=token, urn_bs64=urn_bs64)
+    elif model_guid:
+        indices = get_all_indices_cached(
+            token=token, urn_bs64=urn_bs64, model_guid=model_guid
+        )
+
+    return ModelContext(
         token=token,
+        version_urn=version_urn,
         urn_bs64=urn_bs64,
-        model_guid=model_guid
+        metadata_views=metadata_views,
+        indices=indices,
     )
-    
-    tag_index = build_tag_index(properties_payload)
-    return tag_index
+
+
+# Default highlight color if none specified on a filter row
+_DEFAULT_HIGHLIGHT_COLOR = "#FF0000"
+
+
+def _filters_fingerprint(qc_filters) -> tuple[tuple[tuple[str, ...], str | None, str, str], ...]:
+    """Hashable fingerprint of the QA/QC filter rows, for the compile cache."""
+    return tuple(
+        (
+            tuple(f.get("class_names") or ()),
+            f.get("property_name"),
+            (f.get("expected_value") or "").strip().lower(),
+            f["highlight_color"].hex if f.get("highlight_color") else _DEFAULT_HIGHLIGHT_COLOR,
+        )
+        for f in qc_filters
+        if f.get("class_names")
+    )
+
+
+@cachetools.cached(cachetools.LRUCache(maxsize=32))
+def _compile_filters(fingerprint: tuple[tuple[tuple[str, ...], str | None, str, str], ...]) -> list[dict[str, Any]]:
+    """
+    Compile fingerprinted filter rows into criteria dicts with frozenset
+    class names and a partially evaluated match predicate. Cached so
+    re-renders with unchanged filters (camera moves, unrelated edits) skip
+    the whole compile phase.
+    """
+    filter_criteria: list[dict[str, Any]] = []
+    for class_names, prop_name, expected_value, color_hex in fingerprint:
+        # Partially evaluate the property check into a predicate so the
+        # hot loop runs one call instead of re-branching per element
+        if prop_name and expected_value:
+            def predicate(flat_props, _prop=prop_name, _expected=expected_value):
+                value = flat_props.get(_prop)
+                return value is not None and str(value).strip().lower() == _expected
+        elif prop_name:
+            # Property specified but no value - just check if property exists
+            def predicate(flat_props, _prop=prop_name):
+                return flat_props.get(_prop) is not None
+        else:
+            def predicate(flat_props):
+                return True
+
+        filter_criteria.append({
+            "class_names": frozenset(class_names),
+            "predicate": predicate,
+            "has_property_check": bool(prop_name),
+            "color": color_hex
+        })
+
+    return filter_criteria
 
 
 def get_viewables(params, **kwargs):
@@ -231,29 +600,25 @@ def get_viewables(params, **kwargs):
     if not autodesk_file:
         return []
 
-    integration = vkt.external.OAuth2Integration("aps-integration-viktor")
-    token = integration.get_access_token()
-    version = autodesk_file.get_latest_version(token)
-    version_urn = version.urn
-    urn_bs64 = to_md_urn(version_urn)
+    token = _get_access_token()
+    version_urn, urn_bs64 = _latest_version_urn(autodesk_file, token)
     
     # Get cached metadata viewables (memoized to avoid repeated API calls)
     metadata_views = get_metadata_views_cached(token=token, urn_bs64=urn_bs64)
     
     if not metadata_views:
         return []
-    
-    # Create OptionListElements with name as label and metadata guid as value
-    options = []
-    for viewable in metadata_views:
-        name = viewable.get("name", "Unknown View")
-        guid = viewable.get("guid")
-        role = viewable.get("role", "")
-        if guid:
-            label = f"{name} ({role})" if role else name
-            options.append(vkt.OptionListElement(label=label, value=guid))
-    
-    return options
+
+    # Create OptionListElements with name as label and metadata guid as value;
+    # a single comprehension with a local alias beats a per-item append loop
+    OLE = vkt.OptionListElement
+    return [
+        OLE(label=f"{name} ({role})" if role else name, value=guid)
+        for viewable in metadata_views
+        if (guid := viewable.get("guid"))
+        for name in (viewable.get("name", "Unknown View"),)
+        for role in (viewable.get("role", ""),)
+    ]
 
 
 def get_tag_options(params, **kwargs):
@@ -266,27 +631,18 @@ def get_tag_options(params, **kwargs):
     if not selected_guid:
         return []
 
-    integration = vkt.external.OAuth2Integration("aps-integration-viktor")
-    token = integration.get_access_token()
-    version = autodesk_file.get_latest_version(token)
-    version_urn = version.urn
-    urn_bs64 = to_md_urn(version_urn)
+    token = _get_access_token()
+    version_urn, urn_bs64 = _latest_version_urn(autodesk_file, token)
     
-    # Get cached tag index
-    tag_index = get_tag_index_cached(
+    # Get the cached pre-sorted tags; no re-sort per UI refresh
+    sorted_tags = get_all_indices_cached(
         token=token,
         urn_bs64=urn_bs64,
         model_guid=selected_guid
-    )
-    
-    if not tag_index:
-        return []
-    
-    options = []
-    for tag in sorted(tag_index.keys()):
-        options.append(vkt.OptionListElement(label=tag, value=tag))
-    
-    return options
+    ).sorted_tags
+
+    OLE = vkt.OptionListElement
+    return [OLE(label=tag, value=tag) for tag in sorted_tags]
 
 
 def get_class_name_options(params, **kwargs):
@@ -299,33 +655,25 @@ def get_class_name_options(params, **kwargs):
     if not selected_guid:
         return []
 
-    integration = vkt.external.OAuth2Integration("aps-integration-viktor")
-    token = integration.get_access_token()
-    version = autodesk_file.get_latest_version(token)
-    version_urn = version.urn
-    urn_bs64 = to_md_urn(version_urn)
+    token = _get_access_token()
+    version_urn, urn_bs64 = _latest_version_urn(autodesk_file, token)
     
-    # Get cached class name counts
-    class_counts = get_class_name_counts_cached(
+    # Get the cached class counts, already sorted by count descending
+    sorted_items = get_all_indices_cached(
         token=token,
         urn_bs64=urn_bs64,
         model_guid=selected_guid
-    )
-    
-    if not class_counts:
+    ).sorted_class_counts
+
+    if not sorted_items:
         return []
-    
-    # Sort by count descending and format nicely
-    sorted_items = sorted(class_counts.items(), key=lambda x: x[1], reverse=True)
-    options = []
-    for class_name, count in sorted_items:
-        display_name = class_name.replace('_', ' ')
-        options.append(vkt.OptionListElement(
-            label=f"{display_name} ({count})", 
-            value=class_name
-        ))
-    
-    return options
+
+    # Underscores become spaces for readability in the dropdown labels
+    OLE = vkt.OptionListElement
+    return [
+        OLE(label=f"{class_name.replace('_', ' ')} ({count})", value=class_name)
+        for class_name, count in sorted_items
+    ]
 
 
 class Parametrization(vkt.Parametrization):
@@ -365,10 +713,8 @@ class Controller(vkt.Controller):
         if not autodesk_file:
             return vkt.WebResult(html="<p>Please select a Plant 3D file.</p>")
 
-        integration = vkt.external.OAuth2Integration("aps-integration-viktor")
-        token = integration.get_access_token()
-        version = autodesk_file.get_latest_version(token)
-        version_urn = version.urn
+        token = _get_access_token()
+        version_urn, _ = _latest_version_urn(autodesk_file, token)
         viewer = APSViewer(urn=version_urn, token=token)
         html = viewer.write()
         return vkt.WebResult(html=html)
@@ -380,147 +726,20 @@ class Controller(vkt.Controller):
         selected_guid = params.selected_view
         
         if not autodesk_file or not selected_guid:
-            fig = go.Figure()
-            fig.add_annotation(
-                text="Please select a Plant 3D file and viewable",
-                xref="paper", yref="paper",
-                x=0.5, y=0.5, showarrow=False,
-                font=dict(size=16)
-            )
-            fig.update_layout(
-                title="Quantity Takeoff - PID Elements by Class Name",
-                showlegend=False
-            )
-            return vkt.PlotlyResult(fig)
+            return vkt.PlotlyResult(_EMPTY_FIG_NO_SELECTION)
 
-        integration = vkt.external.OAuth2Integration("aps-integration-viktor")
-        token = integration.get_access_token()
-        version = autodesk_file.get_latest_version(token)
-        version_urn = version.urn
-        urn_bs64 = to_md_urn(version_urn)
-        
-        # Get cached class name counts
-        class_counts = get_class_name_counts_cached(
-            token=token,
-            urn_bs64=urn_bs64,
-            model_guid=selected_guid
-        )
-        
-        if not class_counts:
-            fig = go.Figure()
-            fig.add_annotation(
-                text="No PID elements found in the selected view",
-                xref="paper", yref="paper",
-                x=0.5, y=0.5, showarrow=False,
-                font=dict(size=16)
-            )
-            fig.update_layout(
-                title="Quantity Takeoff - PID Elements by Class Name",
-                showlegend=False
-            )
-            return vkt.PlotlyResult(fig)
-        
-        # Sort by count descending
-        sorted_items = sorted(class_counts.items(), key=lambda x: x[1], reverse=True)
-        # Format labels: replace underscores with spaces for readability
-        labels = [item[0].replace('_', ' ') for item in sorted_items]
-        values = [item[1] for item in sorted_items]
-        total_count = sum(values)
-        
-        # Create subplots: pie chart on left, horizontal bar chart on right
-        fig = make_subplots(
-            rows=1, cols=2,
-            specs=[[{"type": "pie"}, {"type": "bar"}]],
-            column_widths=[0.35, 0.65],
-            horizontal_spacing=0.35,
-            subplot_titles=("Distribution Overview", "Count by Class Name")
-        )
-        
-        # Pie chart - show top 8 categories, group rest as "Other"
-        top_n = 8
-        if len(labels) > top_n:
-            pie_labels = labels[:top_n] + ["Other"]
-            pie_values = values[:top_n] + [sum(values[top_n:])]
-        else:
-            pie_labels = labels
-            pie_values = values
-        
-        # Color palette for consistency
-        colors = [
-            '#636EFA', '#EF553B', '#00CC96', '#AB63FA', '#FFA15A',
-            '#19D3F3', '#FF6692', '#B6E880', '#FF97FF', '#FECB52'
-        ]
-        
-        fig.add_trace(
-            go.Pie(
-                labels=pie_labels,
-                values=pie_values,
-                hole=0.4,
-                textinfo='percent',
-                textposition='outside',
-                marker=dict(colors=colors[:len(pie_labels)]),
-                hovertemplate="<b>%{label}</b><br>Count: %{value}<br>Percentage: %{percent}<extra></extra>",
-                showlegend=False
-            ),
-            row=1, col=1
-        )
-        
-        # Horizontal bar chart - all categories, sorted ascending for bottom-to-top reading
-        bar_labels = labels[::-1]  # Reverse so highest is at top
-        bar_values = values[::-1]
-        
-        # Assign colors based on value (gradient effect)
-        max_val = max(bar_values) if bar_values else 1
-        bar_colors = [f'rgba(99, 110, 250, {0.4 + 0.6 * (v / max_val)})' for v in bar_values]
-        
-        fig.add_trace(
-            go.Bar(
-                x=bar_values,
-                y=bar_labels,
-                orientation='h',
-                marker=dict(
-                    color=bar_colors,
-                    line=dict(color='rgba(99, 110, 250, 1)', width=1)
-                ),
-                text=bar_values,
-                textposition='outside',
-                hovertemplate="<b>%{y}</b><br>Count: %{x}<br>Percentage: %{customdata:.1f}%<extra></extra>",
-                customdata=[v / total_count * 100 for v in bar_values],
-                showlegend=False
-            ),
-            row=1, col=2
-        )
-        
-        # Calculate dynamic height based on number of categories
-        chart_height = max(500, len(labels) * 25 + 150)
-        
-        fig.update_layout(
-            title=dict(
-                text=f"<b>Quantity Takeoff - PID Elements by Class Name</b><br><sup>Total: {total_count} elements | {len(labels)} unique classes</sup>",
-                x=0.5,
-                xanchor='center',
-                font=dict(size=18)
-            ),
-            height=chart_height,
-            margin=dict(t=100, b=50, l=200, r=80),
-            showlegend=False
-        )
-        
-        # Update bar chart x-axis
-        fig.update_xaxes(
-            title_text="Count",
-            row=1, col=2,
-            gridcolor='lightgray',
-            range=[0, max(values) * 1.15]  # Add space for labels
-        )
-        
-        # Update bar chart y-axis
-        fig.update_yaxes(
-            title_text="",
-            row=1, col=2,
-            tickfont=dict(size=10)
-        )
-        
+        # Fetch only the derived indices; this view needs no metadata views
+        context = _fetch_context(autodesk_file, model_guid=selected_guid, include_views=False)
+
+        # Already sorted by count descending at index-build time
+        sorted_items = context.indices.sorted_class_counts
+
+        if not sorted_items:
+            return vkt.PlotlyResult(_EMPTY_FIG_NO_PID)
+
+        # Figure assembly is cached on the counts; unchanged models only
+        # pay the go.Figure reconstruction from the stored dict
+        fig = go.Figure(_build_takeoff_figure_dict(sorted_items))
         return vkt.PlotlyResult(fig)
 
     
@@ -536,17 +755,22 @@ class Controller(vkt.Controller):
         if not selected_guid:
             return vkt.WebResult(html="<p>Please select a viewable.</p>")
 
-        integration = vkt.external.OAuth2Integration("aps-integration-viktor")
-        token = integration.get_access_token()
-        version = autodesk_file.get_latest_version(token)
-        version_urn = version.urn
-        urn_bs64 = to_md_urn(version_urn)
-        
+        # Check the filter rows before any fetching: the default no-filter
+        # state must not pay the payload download and index build
+        qc_filters = params.qc_filters or []
+        has_filters = any(f.get("class_names") for f in qc_filters)
+
+        # Fetch the metadata viewables, plus (concurrently) the derived
+        # indices when there are filters to evaluate
+        context = _fetch_context(
+            autodesk_file, model_guid=selected_guid if has_filters else None
+        )
+
         # Create viewer
-        viewer = APSViewer(urn=version_urn, token=token)
-        
-        # Get viewables and set the selected view
-        viewables = viewer.get_viewables(urn_bs64)
+        viewer = APSViewer(urn=context.version_urn, token=context.token)
+
+        # Set the selected view from the already-fetched metadata viewables
+        viewables = context.metadata_views
         if viewables:
             selected_viewable = next(
                 (v for v in viewables if v.get("guid") == selected_guid),
@@ -557,107 +781,70 @@ class Controller(vkt.Controller):
                 selected_viewable.get("name", "View"),
                 selected_viewable.get("role", "3d")
             )
-        
-        # Parse filters from params
-        qc_filters = params.qc_filters or []
-        
+
         # If no filters, show viewer without highlighting
-        if not qc_filters or all(not f.get("class_names") for f in qc_filters):
+        if not has_filters:
             html = viewer.write()
             return vkt.WebResult(html=html)
-        
-        # Get properties payload
-        properties_payload = get_properties_payload_cached(
-            token=token,
-            urn_bs64=urn_bs64,
-            model_guid=selected_guid
-        )
-        
-        data = properties_payload.get("data", {})
-        collection = data.get("collection", [])
-        
-        # Default color if none specified
-        default_color = "#FF0000"
-        
-        # Build filter criteria with colors from user selection
-        filter_criteria = []
-        for idx, f in enumerate(qc_filters):
-            class_names = f.get("class_names") or []
-            if not class_names:
-                continue
-            
-            # Get color from user selection, use default if not set
-            user_color = f.get("highlight_color")
-            if user_color:
-                color_hex = user_color.hex
-            else:
-                color_hex = default_color
-            
-            filter_criteria.append({
-                "class_names": class_names,
-                "property_name": f.get("property_name"),
-                "expected_value": (f.get("expected_value") or "").strip(),
-                "color": color_hex
-            })
-        
-        if not filter_criteria:
-            html = viewer.write()
-            return vkt.WebResult(html=html)
-        
-        # Find matching elements
-        highlight_elements: list[ElementsInScene] = []
-        
-        for obj in collection:
-            if not isinstance(obj, dict):
-                continue
-            
-            obj_props = obj.get("properties")
-            if not isinstance(obj_props, dict):
-                continue
-            
-            external_id = obj.get("externalId")
-            if not external_id:
-                continue
-            
-            # Get element's class name
-            obj_class_name = find_prop_any_group(obj_props, "Class Name")
-            if obj_class_name is None:
-                continue
-            
-            # Check if element matches any filter
+
+        # Objects grouped by class name, built alongside the other indices
+        by_class_name = context.indices.by_class_name
+
+        # Compile filter criteria; cached on the row fingerprint so unchanged
+        # filters cost one dict lookup per render
+        filter_criteria = _compile_filters(_filters_fingerprint(qc_filters))
+
+        # Find matching elements, touching only the buckets of targeted
+        # classes instead of iterating the whole collection. Matches are
+        # collected per color so the hot loop only appends a string.
+        by_color: defaultdict[str, list[str]] = defaultdict(list)
+
+        if len(filter_criteria) == 1 and not filter_criteria[0]["has_property_check"]:
+            # Common interactive case: one filter, no property check. Every
+            # element in the selected class buckets matches, so copy the
+            # externalIds straight out without calling any predicate.
+            criteria = filter_criteria[0]
+            external_ids = by_color[criteria["color"]]
+            for obj_class_name in criteria["class_names"]:
+                external_ids.extend(
+                    record["externalId"] for record in by_class_name.get(obj_class_name, ())
+                )
+        else:
+            # Reverse map so each object looks up its matching filters in O(1)
+            # instead of testing membership against every filter's class list
+            class_to_criteria: defaultdict[str, list[dict[str, Any]]] = defaultdict(list)
             for criteria in filter_criteria:
-                # Check if class name is in the selected class names
-                if obj_class_name not in criteria["class_names"]:
-                    continue
-                
-                # If property name is specified, check property match
-                prop_name = criteria.get("property_name")
-                expected_val = criteria.get("expected_value")
-                
-                if prop_name and expected_val:
-                    # Check if property matches expected value
-                    actual_val = find_prop_any_group(obj_props, prop_name)
-                    if actual_val is None:
-                        continue
-                    if str(actual_val).strip().lower() != expected_val.lower():
-                        continue
-                elif prop_name and not expected_val:
-                    # Property specified but no value - just check if property exists
-                    actual_val = find_prop_any_group(obj_props, prop_name)
-                    if actual_val is None:
-                        continue
-                
-                # Element matches - highlight it with this filter's color
-                highlight_elements.append({
-                    "externalElementId": external_id,
-                    "color": criteria["color"]
-                })
-                break  # Element matched, use first matching filter's color
-        
-        # Apply highlighting
+                for class_name in criteria["class_names"]:
+                    class_to_criteria[class_name].append(criteria)
+
+            for obj_class_name, criteria_list in class_to_criteria.items():
+                for record in by_class_name.get(obj_class_name, ()):
+                    # Records without an externalId were filtered at build time
+                    external_id = record["externalId"]
+                    flat_props = record["flat_props"]
+
+                    # Check if element matches any filter targeting this class
+                    for criteria in criteria_list:
+                        if not criteria["predicate"](flat_props):
+                            continue
+
+                        # Element matches - highlight it with this filter's color
+                        by_color[criteria["color"]].append(external_id)
+                        break  # Element matched, use first matching filter's color
+
+        # Apply highlighting - synthesize the per-element payload in a single
+        # comprehension from the color groups. Guard on the materialized list:
+        # the fast path may have created an empty color group when the
+        # selected classes have no objects, and an empty highlight call must
+        # not be issued.
+        highlight_elements: list[ElementsInScene] = [
+            {"externalElementId": external_id, "color": color}
+            for color, external_ids in by_color.items()
+            for external_id in external_ids
+        ]
         if highlight_elements:
             viewer.highlight_elements(highlight_elements)
-        
+
         html = viewer.write()
         return vkt.WebResult(html=html)
     
\ No newline at end of file